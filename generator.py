@@ -23,89 +23,104 @@ from typing import List, Tuple
 # Brute-force evaluator (same semantics as solution_bf.py)
 # ----------------------------
 
-def build_version_tree_from_ops(q_ops: List[Tuple]) -> Tuple[List, List[List[int]]]:
+# op_type codes for the flat op arrays
+OP_UNDO = 0
+OP_ADD = 1
+
+def build_version_tree_from_ops(q_ops: List[Tuple]) -> Tuple[Tuple[List[int], ...], List[List[int]]]:
     """
     Input q_ops: list of parsed ops for i = 1..q, each:
         ('add', l, r, k, p, x)  or  ('undo', t)
     Returns:
-        ops: 1-indexed list with ops[i]
+        (op_type, op_l, op_r, op_k, op_p, op_x): 1-indexed parallel arrays
+            (op_l holds t for an undo node)
         children: adjacency list for nodes 0..q
     """
     q = len(q_ops)
-    ops = [None] * (q + 1)
+    op_type = [OP_UNDO] * (q + 1)
+    op_l = [0] * (q + 1)
+    op_r = [0] * (q + 1)
+    op_k = [0] * (q + 1)
+    op_p = [0] * (q + 1)
+    op_x = [0] * (q + 1)
     parent = [0] * (q + 1)
     children = [[] for _ in range(q + 1)]
 
     cur = 0
     for i in range(1, q + 1):
         op = q_ops[i - 1]
-        ops[i] = op
         if op[0] == 'add':
+            _, l, r, k, p, x = op
+            op_type[i] = OP_ADD
+            op_l[i] = l; op_r[i] = r; op_k[i] = k; op_p[i] = p; op_x[i] = x
             parent[i] = cur
             children[parent[i]].append(i)
             cur = i
         else:
             # undo to t
             t = op[1]
+            op_l[i] = t
             parent[i] = t
             children[parent[i]].append(i)
             cur = i
-    return ops, children
+    return (op_type, op_l, op_r, op_k, op_p, op_x), children
 
 def brute_force_answers(n: int, a: List[int], q_ops: List[Tuple]) -> List[int]:
     """
     Returns answers for operations 1..q in input order using a DFS over the version tree.
+    The total is kept incrementally: only indices in [l, r] are rescanned when a
+    layer is pushed or popped, instead of rescanning all n indices at every node.
     """
-    base_sum = sum(a[1:])
-    ops, children = build_version_tree_from_ops(q_ops)
+    (op_type, op_l, op_r, op_k, op_p, op_x), children = build_version_tree_from_ops(q_ops)
     stacks = [[] for _ in range(n + 1)]  # per-index active layers: list of (k,p,x)
     ans = [0] * (len(q_ops) + 1)
+    total = sum(a[1:])
+
+    def contrib(i):
+        # brute force: scan the whole stack for the max-k layer
+        if not stacks[i]:
+            return 0
+        mk = -1
+        mp = 0
+        mx = 0
+        for (kk, pp, xx) in stacks[i]:
+            if kk > mk:
+                mk = kk
+                mp = pp
+                mx = xx
+        cover = len(stacks[i])
+        if (cover & 1) == mp:
+            return mx
+        else:
+            return -mx
 
     def apply_range(l, r, k, p, x):
+        nonlocal total
         for i in range(l, r + 1):
+            total -= contrib(i)
             stacks[i].append((k, p, x))
+            total += contrib(i)
 
     def revert_range(l, r):
+        nonlocal total
         for i in range(l, r + 1):
+            total -= contrib(i)
             stacks[i].pop()
-
-    def recompute_total():
-        total = base_sum
-        for i in range(1, n + 1):
-            if not stacks[i]:
-                continue
-            mk = -1
-            mp = 0
-            mx = 0
-            for (kk, pp, xx) in stacks[i]:
-                if kk > mk:
-                    mk = kk
-                    mp = pp
-                    mx = xx
-            cover = len(stacks[i])
-            if (cover & 1) == mp:
-                total += mx
-            else:
-                total -= mx
-        return total
+            total += contrib(i)
 
     def dfs(u: int):
-        tag = None
+        added = op_type[u] == OP_ADD
+        if added:
+            apply_range(op_l[u], op_r[u], op_k[u], op_p[u], op_x[u])
+        # 'undo' node applies no direct change here
         if u != 0:
-            op = ops[u]
-            if op[0] == 'add':
-                _, l, r, k, p, x = op
-                apply_range(l, r, k, p, x)
-                tag = ('add', l, r)
-            # 'undo' node applies no direct change here
-            ans[u] = recompute_total()
+            ans[u] = total
 
         for v in children[u]:
             dfs(v)
 
-        if tag and tag[0] == 'add':
-            _, l, r = tag
-            revert_range(l, r)
+        if added:
+            revert_range(op_l[u], op_r[u])
 
     dfs(0)
     return ans[1:]  # answers for i=1..q
@@ -184,16 +199,15 @@ def make_case_nested(n: int, q: int, deep: int = 6, width: int = 2) -> Tuple[Lis
 
     # Add undos bouncing around the build steps
     extra = max(0, q - len(ops))
-    for i in range(extra):
-        t = random.randint(0, min(len(ops), deep * (1 + width)) - 1)
-        ops.append(('undo', t))
+    t_max = min(len(ops), deep * (1 + width)) - 1
+    ops.extend(('undo', random.randint(0, t_max)) for _ in range(extra))
 
-    # Trim or pad
+    # Trim or pad (one batch; random draws happen in the same order as a
+    # per-op loop, so a given seed still yields the same case)
     ops = ops[:q]
-    while len(ops) < q:
-        l, r = rand_range(n)
-        ops.append(('add', l, r, k, random.randint(0, 1), random.randint(1, 6)))
-        k += 1
+    need = q - len(ops)
+    ops.extend(('add', *rand_range(n), k + j, random.randint(0, 1), random.randint(1, 6))
+               for j in range(need))
 
     return a, ops
 
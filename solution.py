@@ -1,241 +1,257 @@
 import sys
-sys.setrecursionlimit(1_000_000)
-rd = sys.stdin.buffer.readline
+from array import array
 
 # ----------------------------
 # Utilities: Version tree build
 # ----------------------------
 
-def build_version_tree(q):
+# op_type codes for the flat op arrays
+OP_UNDO = 0
+OP_ADD = 1
+
+def build_version_tree(q, nxt):
     """
     Build a rooted tree of operations (version tree).
     Node 0 is the initial state.
     For i=1..q:
       - If op is '+ l r k p x': parent[i] = current; current = i
       - If op is '- t': parent[i] = t; current = i
+    Ops are stored as six parallel int arrays indexed by node id instead of
+    per-node tuples; for an undo node op_l holds the target t.
+    nxt() returns the next whitespace-separated input token (bytes).
     Returns:
-      ops: list of op tuples (None at 0), either ('add', l, r, k, p, x) or ('undo', t)
+      op_type, op_l, op_r, op_k, op_p, op_x: length q+1 (node 0 unused)
       ch: adjacency list of children
     """
-    ops_raw = [rd().split() for _ in range(q)]
-    ops = [None] * (q + 1)
+    op_type = [OP_UNDO] * (q + 1)
+    op_l = [0] * (q + 1)
+    op_r = [0] * (q + 1)
+    op_k = [0] * (q + 1)
+    op_p = [0] * (q + 1)
+    op_x = [0] * (q + 1)
     parent = [0] * (q + 1)
     ch = [[] for _ in range(q + 1)]
 
     cur = 0
     for i in range(1, q + 1):
-        t = ops_raw[i - 1]
-        if t[0] == b'+':
-            l = int(t[1]); r = int(t[2])
-            k = int(t[3]); p = int(t[4]); x = int(t[5])
-            ops[i] = ('add', l, r, k, p, x)
+        if nxt() == b'+':
+            op_type[i] = OP_ADD
+            op_l[i] = int(nxt()); op_r[i] = int(nxt())
+            op_k[i] = int(nxt()); op_p[i] = int(nxt()); op_x[i] = int(nxt())
             parent[i] = cur
             ch[parent[i]].append(i)
             cur = i
         else:
             # "- t"
-            to = int(t[1])
-            ops[i] = ('undo', to)
+            to = int(nxt())
+            op_l[i] = to
             parent[i] = to
             ch[parent[i]].append(i)
             cur = i
-    return ops, ch
+    return (op_type, op_l, op_r, op_k, op_p, op_x), ch
 
 
-# ----------------------------------------
-# Core state with rollback (simple version)
-# ----------------------------------------
+# ----------------------------------------------
+# Core state: segment tree over indices, rollback
+# ----------------------------------------------
 
 class SpellbookState:
     """
     Maintains:
       - base array a[1..n]
-      - per-index stacks of active layers (k, p, x), where top is max-k
-      - per-index coverage count
-      - current total sum = sum(a) + sum(contribution(i))
+      - every applied layer j >= 1 as lk[j], lp[j], lx[j] (j = 0 means none:
+        k = -1, x = 0)
+      - a segment tree over indices 1..n; node v keeps
+          fl[v], lid[v]  its tags: pending parity flip and pending top layer
+                         for the children (for a leaf: its own parity and top)
+          sm[v]          sum of contributions in the node
+          odd[v]         how many indices have odd coverage
+          mn[v], mx[v]   min/max top k in the node (-1 = no top)
+      - current total sum = sum(a) + sm[root]
     Contribution rule at index i:
       let top layer be (k,p,x) with k = max of active ks at i (if any),
       let c = coverage_count[i],
       if (c % 2) == p: +x else -x
+    A covered node flips parity (odd -> len - odd, sm -> -sm); a layer
+    with k > mx[v] becomes the whole node's top (on equal k the earlier
+    layer stays on top); nodes with mn[v] < k <= mx[v] are split.
+    O(log n) per range while tops in [l, r] are uniform, O(r - l) when they
+    alternate around k.
+    Rollback: the log keeps only old tags, packed as lid << sh | v << 1 | fl
+    in an array('q'); revert_to recomputes sm/odd/mn/mx from them.
     """
     __slots__ = (
-        "n", "a", "base_sum", "cover", "stacks", "top", "total",
-        "changes"
+        "n", "a", "base_sum", "size", "sh", "ln", "sm", "odd", "mn", "mx",
+        "fl", "lid", "lk", "lp", "lx", "total", "log"
     )
     def __init__(self, a):
-        self.n = len(a) - 1  # a is 1-indexed
+        self.n = n = len(a) - 1  # a is 1-indexed
         self.a = a
         self.base_sum = sum(a[1:])
-        self.cover = [0] * (self.n + 1)     # coverage count per index
-        self.stacks = [[] for _ in range(self.n + 1)]  # stack of (k,p,x); track max-k on top by sorted pushes
-        self.top = [None] * (self.n + 1)    # cached top (p, x) or None
+        self.size = size = 4 * max(n, 1)
+        self.sh = (2 * size).bit_length()    # log record: lid << sh | v << 1 | fl
+        self.ln = array('i', [0]) * size     # node length (static after _build)
+        self.sm = [0] * size
+        self.odd = [0] * size
+        self.mn = [-1] * size
+        self.mx = [-1] * size
+        self.fl = [0] * size
+        self.lid = [0] * size
+        self.lk = [-1]                       # layer table, slot 0 = no layer
+        self.lp = [0]
+        self.lx = [0]
         self.total = self.base_sum           # base + contributions
-        self.changes = []                    # rollback stack of callables
-
-    # ---- Helpers to compute per-index contribution ----
-    @staticmethod
-    def contrib_for(cov, top):
-        if top is None:
-            return 0
-        p, x = top
-        if (cov & 1) == p:
-            return x
-        else:
-            return -x
-
-    # ---- Internal primitive: set top for one index (with rollback) ----
-    def _set_top(self, i, new_top):
-        old_top = self.top[i]
-        if old_top == new_top:
-            # no change, but keep rollback noop for symmetry if desired
-            return
-
-        # Adjust total by removing old contrib, adding new contrib
-        delta = 0
-        if old_top is not None:
-            delta -= self.contrib_for(self.cover[i], old_top)
-        if new_top is not None:
-            delta += self.contrib_for(self.cover[i], new_top)
-        self.total += delta
-
-        self.top[i] = new_top
-
-        def undo():
-            # revert to old_top
-            # reverse delta
-            rev_delta = 0
-            cur = self.top[i]
-            if cur is not None:
-                rev_delta -= self.contrib_for(self.cover[i], cur)
-            if old_top is not None:
-                rev_delta += self.contrib_for(self.cover[i], old_top)
-            self.total += rev_delta
-            self.top[i] = old_top
-
-        self.changes.append(undo)
-
-    # ---- Internal primitive: bump coverage for one index (with rollback) ----
-    def _add_cover(self, i, d):
-        # coverage changes parity -> may flip sign of contribution
-        # remove old contrib, update cover, add new contrib
-        old_cov = self.cover[i]
-        old_top = self.top[i]
-        delta = 0
-        if old_top is not None:
-            delta -= self.contrib_for(old_cov, old_top)
-        new_cov = old_cov + d
-        self.cover[i] = new_cov
-        if old_top is not None:
-            delta += self.contrib_for(new_cov, old_top)
-        self.total += delta
-
-        def undo():
-            # revert coverage
-            cur_cov = self.cover[i]
-            cur_top = self.top[i]
-            rev = 0
-            if cur_top is not None:
-                rev -= self.contrib_for(cur_cov, cur_top)
-            self.cover[i] = old_cov
-            if cur_top is not None:
-                rev += self.contrib_for(old_cov, cur_top)
-            self.total += rev
-
-        self.changes.append(undo)
-
-    # ---- Applying a layer to index i ----
-    def _apply_layer_at_i(self, i, k, p, x):
+        self.log = array('q')                # rollback stack of packed tags
+        if n:
+            self._build(1, 1, n)
+
+    def _build(self, v, lo, hi):
+        self.ln[v] = hi - lo + 1
+        if lo < hi:
+            mid = (lo + hi) >> 1
+            self._build(2 * v, lo, mid)
+            self._build(2 * v + 1, mid + 1, hi)
+
+    # ---- Node primitives ----
+    def _tag(self, v, f, j):
         """
-        Push a layer (k,p,x) to index i:
-          - Increase coverage by +1
-          - Insert into stack maintaining 'top' = layer with maximum k
+        One logged transition for a whole node: flip coverage parity if f,
+        then make layer j the top of every index in it if j > 0.
         """
-        # 1) coverage +1
-        self._add_cover(i, +1)
-
-        # 2) stacks[i] insert by k; we keep all layers but track top by k=max
-        # We don’t need full sort; just push and update top if k is new max.
-        prev_top = self.top[i]
-        # Determine current max-k (implicit):
-        # If prev_top is None, any push becomes top.
-        # If prev_top exists and this k is bigger than the k behind prev_top, we promote.
-        # To know the k behind prev_top we must also store k there.
-        # So: keep a parallel "best k" for i. We can recover k from stack by scanning
-        #   but that would be O(height). To keep it simple and still correct, we scan.
-        self.stacks[i].append((k, p, x))
-
-        # compute new max layer among active
-        mk = -1
-        mp = 0
-        mx = 0
-        for (kk, pp, xx) in self.stacks[i]:
-            if kk > mk:
-                mk = kk; mp = pp; mx = xx
-        new_top = (mp, mx)
-
-        # If top changed, update it
-        self._set_top(i, new_top)
-
-        def undo():
-            # pop from stack and recompute top
-            self.stacks[i].pop()
-            # recompute new top after pop
-            mk2 = -1
-            mp2 = 0
-            mx2 = 0
-            for (kk, pp, xx) in self.stacks[i]:
-                if kk > mk2:
-                    mk2 = kk; mp2 = pp; mx2 = xx
-            new_top2 = None if mk2 < 0 else (mp2, mx2)
-            # set_top with rollback-neutral (but we are in an undo function, so do a direct inverse of set_top)
-            # We cannot call _set_top here because that would push another undo. So we do manual inverse:
-            cur_top = self.top[i]
-            # adjust total: remove cur_top contrib, add new_top2 contrib
-            delta = 0
-            if cur_top is not None:
-                delta -= self.contrib_for(self.cover[i], cur_top)
-            if new_top2 is not None:
-                delta += self.contrib_for(self.cover[i], new_top2)
-            self.total += delta
-            self.top[i] = new_top2
-
-            # also revert coverage (+1) we did earlier
-            # but coverage revert must match the order of our change pushes:
-            # Here, we are inside the undo for the second push (stack/top),
-            # the coverage undo is a separate callable earlier on the stack and will be called automatically
-            # by the main rollback routine; hence DO NOT touch coverage here.
-
-        # Replace the last change (which was _set_top) with a combined undo that also restores stack
-        # Actually, we can just append a separate undo for stack pop; order matters:
-        self.changes.append(undo)
-
-    # ---- Removing a layer from index i (inverse of apply) ----
-    def _remove_layer_at_i(self, i, k, p, x):
+        fl = self.fl; lid = self.lid; sm = self.sm; odd = self.odd
+        self.log.append(lid[v] << self.sh | v << 1 | fl[v])
+        o = odd[v]; s = sm[v]
+        if f:
+            o = self.ln[v] - o
+            odd[v] = o
+            s = -s
+            fl[v] ^= 1
+        if j:
+            lid[v] = j
+            self.mn[v] = self.mx[v] = self.lk[j]
+            # +x on indices whose parity equals p, -x on the rest:
+            # p = 1 -> x*o - x*(n-o), p = 0 -> x*(n-o) - x*o; no branch on p
+            s = (2 * self.lp[j] - 1) * self.lx[j] * (2 * o - self.ln[v])
+        sm[v] = s
+
+    def _apply(self, v, lo, hi, l, r, k, j):
+        if r < lo or hi < l:
+            return
+        if l <= lo and hi <= r:
+            if self.mx[v] < k:
+                self._tag(v, 1, j)
+                return
+            if self.mn[v] >= k:
+                self._tag(v, 1, 0)
+                return
+        # Split: log v's tags once (even if empty, so revert_to rebuilds it),
+        # push them down, recurse, and pull v back up from the children.
+        fl = self.fl; lid = self.lid
+        f = fl[v]; t = lid[v]
+        self.log.append(t << self.sh | v << 1 | f)
+        a = 2 * v; b = a + 1
+        if f or t:
+            self._tag(a, f, t)
+            self._tag(b, f, t)
+            fl[v] = 0
+            lid[v] = 0
+        mid = (lo + hi) >> 1
+        self._apply(a, lo, mid, l, r, k, j)
+        self._apply(b, mid + 1, hi, l, r, k, j)
+        sm = self.sm; odd = self.odd; mn = self.mn; mx = self.mx
+        sm[v] = sm[a] + sm[b]
+        odd[v] = odd[a] + odd[b]
+        mn[v] = mn[a] if mn[a] < mn[b] else mn[b]
+        mx[v] = mx[a] if mx[a] > mx[b] else mx[b]
+
+    def _apply_point(self, i, k, j):
         """
-        Exact inverse of _apply_layer_at_i for the same (i,k,p,x) in LIFO order at DFS.
-        This is handled automatically by the rollback stack, so we don't need a separate public API.
+        _apply for l == r, walked down and back up without recursion: every
+        node on the path to leaf i is split, so there is nothing to decide.
         """
+        fl = self.fl; lid = self.lid; log = self.log; sh = self.sh
+        tag = self._tag
+        path = []
+        v = 1; lo = 1; hi = self.n
+        while lo < hi:
+            f = fl[v]; t = lid[v]
+            log.append(t << sh | v << 1 | f)
+            a = 2 * v
+            if f or t:
+                tag(a, f, t)
+                tag(a + 1, f, t)
+                fl[v] = 0
+                lid[v] = 0
+            path.append(v)
+            mid = (lo + hi) >> 1
+            if i <= mid:
+                v = a; hi = mid
+            else:
+                v = a + 1; lo = mid + 1
+        tag(v, 1, j if self.mx[v] < k else 0)
+        sm = self.sm; odd = self.odd; mn = self.mn; mx = self.mx
+        for v in reversed(path):
+            a = 2 * v; b = a + 1
+            sm[v] = sm[a] + sm[b]
+            odd[v] = odd[a] + odd[b]
+            mn[v] = mn[a] if mn[a] < mn[b] else mn[b]
+            mx[v] = mx[a] if mx[a] > mx[b] else mx[b]
 
     # ---- Public range APIs used by DFS ----
     def apply_layer_range(self, l, r, k, p, x):
         """
-        Apply one layer over [l, r]. We push two changes per i:
-          - coverage +1 (with rollback)
-          - push layer to stack, recompute top (with rollback)
+        Apply one layer over [l, r]: coverage +1 everywhere, and (k,p,x)
+        becomes the top wherever k beats the current top k.
         """
-        for i in range(l, r + 1):
-            self._apply_layer_at_i(i, k, p, x)
+        j = len(self.lk)
+        self.lk.append(k); self.lp.append(p); self.lx.append(x)
+        if l == r:
+            self._apply_point(l, k, j)
+        else:
+            self._apply(1, 1, self.n, l, r, k, j)
+        self.total = self.base_sum + self.sm[1]
 
     def revert_to(self, checkpoint_size):
         """
-        Rollback all changes down to checkpoint_size (LIFO).
+        Rollback all changes down to checkpoint_size (LIFO): restore each
+        logged node's tags, then rebuild sm/odd/mn/mx from the tags and
+        (unless it is a leaf) the children. Records are undone newest first,
+        so a node's children are already restored when it is rebuilt.
         """
-        while len(self.changes) > checkpoint_size:
-            undo = self.changes.pop()
-            undo()
+        log = self.log
+        if len(log) <= checkpoint_size:
+            return
+        ln = self.ln; sm = self.sm; odd = self.odd; mn = self.mn; mx = self.mx
+        fl = self.fl; lid = self.lid; lk = self.lk; lp = self.lp; lx = self.lx
+        sh = self.sh; vmask = (1 << sh) - 1
+        for i in range(len(log) - 1, checkpoint_size - 1, -1):
+            rec = log[i]
+            v = (rec & vmask) >> 1
+            f = rec & 1
+            j = rec >> sh
+            fl[v] = f
+            lid[v] = j
+            n = ln[v]
+            if n == 1:
+                o = f
+            else:
+                a = 2 * v; b = a + 1
+                o = odd[a] + odd[b]
+                if f:
+                    o = n - o
+            odd[v] = o
+            if j or n == 1:
+                mn[v] = mx[v] = lk[j]
+                sm[v] = (2 * lp[j] - 1) * lx[j] * (2 * o - n)
+            else:
+                mn[v] = mn[a] if mn[a] < mn[b] else mn[b]
+                mx[v] = mx[a] if mx[a] > mx[b] else mx[b]
+                sm[v] = -(sm[a] + sm[b]) if f else sm[a] + sm[b]
+        del log[checkpoint_size:]
+        self.total = self.base_sum + self.sm[1]
 
     def checkpoint(self):
-        return len(self.changes)
+        return len(self.log)
 
 
 # --------------------------
@@ -243,47 +259,67 @@ class SpellbookState:
 # --------------------------
 
 def main():
-    n, q = map(int, rd().split())
-    arr = [0] + list(map(int, rd().split()))  # 1-indexed
+    # Read the whole input once and walk the tokens.
+    nxt = iter(sys.stdin.buffer.read().split()).__next__
+    n = int(nxt()); q = int(nxt())
+    arr = [0] + [int(nxt()) for _ in range(n)]  # 1-indexed
 
-    ops, children = build_version_tree(q)
+    (op_type, op_l, op_r, op_k, op_p, op_x), children = build_version_tree(q, nxt)
 
     state = SpellbookState(arr)
     ans = [0] * (q + 1)
+    log = state.log
 
-    def enter_node(op):
+    def enter_chain(u, last):
         """
-        Apply this node's effect and return a checkpoint for rollback on exit.
-        'undo' nodes do not change the state directly (the parent pointer already encoded time jump).
+        Apply node u and then every node of the single-child chain below it,
+        recording each node's answer as we go. Returns the chain's last node.
+        Nothing can branch off the chain, so all of its nodes are exited
+        together and share the one checkpoint taken before u.
+        'undo' nodes (and the root) apply nothing: the jump back in time is
+        already encoded by where they hang in the version tree.
+        If last is set, nothing is entered after this chain is exited, so
+        no rollback record it writes is ever needed and the log is dropped
+        after each node.
         """
-        cp = state.checkpoint()
-        if op is None:
-            return cp
-        if op[0] == 'add':
-            _, l, r, k, p, x = op
-            state.apply_layer_range(l, r, k, p, x)
+        while True:
+            if op_type[u] == OP_ADD:
+                state.apply_layer_range(op_l[u], op_r[u], op_k[u], op_p[u], op_x[u])
+                if last:
+                    del log[:]
+            if u != 0:
+                ans[u] = state.total
+            ch = children[u]
+            if len(ch) != 1:
+                return u
+            u = ch[0]
+
+    # Iterative DFS: u >= 0 on the stack means "enter the chain at u", ~u
+    # means "exit it". Children are pushed reversed so they are visited in
+    # input order. pending counts the enter entries on the stack; once it
+    # drops to 0, the remaining exits only undo work nobody reads, so the
+    # log (and with it every older checkpoint) is dropped. With no undo ops
+    # the whole input is one chain and the log never grows.
+    cps = []
+    stack = [0]
+    pending = 1
+    while stack:
+        u = stack.pop()
+        if u >= 0:
+            pending -= 1
+            last = not pending
+            if last:
+                del log[:]
+            cps.append(state.checkpoint())
+            u = enter_chain(u, last)
+            stack.append(~u)
+            ch = children[u]
+            stack.extend(reversed(ch))
+            pending += len(ch)
         else:
-            # 'undo' node: nothing to apply here
-            pass
-        return cp
-
-    def dfs(u):
-        cp = enter_node(ops[u])
-
-        if u != 0:
-            ans[u] = state.total
-
-        for v in children[u]:
-            dfs(v)
+            state.revert_to(cps.pop())
 
-        state.revert_to(cp)
-
-    dfs(0)
-
-    out = []
-    for i in range(1, q + 1):
-        out.append(str(ans[i]))
-    sys.stdout.write("\n".join(out))
+    sys.stdout.buffer.write("\n".join(map(str, ans[1:])).encode())
 
 
 if __name__ == "__main__":
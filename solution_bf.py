@@ -17,48 +17,56 @@
 #   - Use for small/medium tests and as a correctness oracle.
 
 import sys
-sys.setrecursionlimit(1_000_000)
-rd = sys.stdin.buffer.readline
 
-def build_version_tree(q):
+# op_type codes for the flat op arrays
+OP_UNDO = 0
+OP_ADD = 1
+
+def build_version_tree(q, nxt):
     """
     Node 0 is the initial state.
     For i=1..q:
       '+ l r k p x'  -> parent[i] = current; current = i
       '- t'          -> parent[i] = t; current = i
+    nxt() returns the next whitespace-separated input token (bytes).
     Returns:
-      ops[i] = ('add', l,r,k,p,x) or ('undo', t)
+      op_type, op_l, op_r, op_k, op_p, op_x: parallel arrays indexed by node
+        (op_l holds t for an undo node)
       children adjacency list
     """
-    ops_raw = [rd().split() for _ in range(q)]
-    ops = [None] * (q + 1)
+    op_type = [OP_UNDO] * (q + 1)
+    op_l = [0] * (q + 1)
+    op_r = [0] * (q + 1)
+    op_k = [0] * (q + 1)
+    op_p = [0] * (q + 1)
+    op_x = [0] * (q + 1)
     parent = [0] * (q + 1)
     children = [[] for _ in range(q + 1)]
 
     cur = 0
     for i in range(1, q + 1):
-        t = ops_raw[i - 1]
-        if t[0] == b'+':
-            l = int(t[1]); r = int(t[2])
-            k = int(t[3]); p = int(t[4]); x = int(t[5])
-            ops[i] = ('add', l, r, k, p, x)
+        if nxt() == b'+':
+            op_type[i] = OP_ADD
+            op_l[i] = int(nxt()); op_r[i] = int(nxt())
+            op_k[i] = int(nxt()); op_p[i] = int(nxt()); op_x[i] = int(nxt())
             parent[i] = cur
             children[parent[i]].append(i)
             cur = i
         else:
-            to = int(t[1])
-            ops[i] = ('undo', to)
+            to = int(nxt())
+            op_l[i] = to
             parent[i] = to
             children[parent[i]].append(i)
             cur = i
-    return ops, children
+    return (op_type, op_l, op_r, op_k, op_p, op_x), children
 
 def main():
-    n, q = map(int, rd().split())
-    a = [0] + list(map(int, rd().split()))  # 1-indexed
+    nxt = iter(sys.stdin.buffer.read().split()).__next__
+    n = int(nxt()); q = int(nxt())
+    a = [0] + [int(nxt()) for _ in range(n)]  # 1-indexed
     base_sum = sum(a[1:])
 
-    ops, children = build_version_tree(q)
+    (op_type, op_l, op_r, op_k, op_p, op_x), children = build_version_tree(q, nxt)
 
     # Active layers per index: list of (k, p, x)
     stacks = [[] for _ in range(n + 1)]
@@ -92,35 +100,29 @@ def main():
 
     ans = [0] * (q + 1)
 
-    def dfs(u):
-        # Enter: apply op at this node
-        tag = None
-        if u != 0:
-            op = ops[u]
-            if op[0] == 'add':
-                _, l, r, k, p, x = op
-                apply_range(l, r, k, p, x)
-                tag = ('add', l, r)  # for revert
-            else:
+    # Iterative DFS: u >= 0 on the stack means "enter u", ~u means "exit u".
+    stack = [0]
+    while stack:
+        u = stack.pop()
+        if u >= 0:
+            # Enter: apply op at this node
+            if u != 0:
+                if op_type[u] == OP_ADD:
+                    apply_range(op_l[u], op_r[u], op_k[u], op_p[u], op_x[u])
                 # 'undo' node has no direct state change here
-                tag = None
-
-            # Record answer after applying this operation
-            ans[u] = recompute_total()
-        # Visit children
-        for v in children[u]:
-            dfs(v)
-        # Exit: revert this node's change
-        if tag and tag[0] == 'add':
-            _, l, r = tag
-            revert_range(l, r)
 
-    dfs(0)
+                # Record answer after applying this operation
+                ans[u] = recompute_total()
+            # Visit children (reversed so they pop in input order)
+            stack.append(~u)
+            stack.extend(reversed(children[u]))
+        else:
+            # Exit: revert this node's change
+            u = ~u
+            if op_type[u] == OP_ADD:
+                revert_range(op_l[u], op_r[u])
 
-    out = []
-    for i in range(1, q + 1):
-        out.append(str(ans[i]))
-    sys.stdout.write("\n".join(out))
+    sys.stdout.buffer.write("\n".join(map(str, ans[1:])).encode())
 
 if __name__ == "__main__":
     main()